@@ -1,11 +1,20 @@
 import streamlit as st
 import pandas as pd
 import re
-import os
+import sys
 import json
 import base64
+import functools
 import requests
 from io import BytesIO
+from typing import Optional
+
+# calamine (Rust) parses xlsx much faster than openpyxl; fall back if it is missing.
+try:
+    import python_calamine  # noqa: F401
+    _EXCEL_READ_ENGINE = "calamine"
+except ImportError:
+    _EXCEL_READ_ENGINE = "openpyxl"
 
 ############################
 #  MULTIPLIER DICTIONARY   #
@@ -32,84 +41,154 @@ MULTIPLIER_MAPPING = {
     'y': 1e-24
 }
 
+# Longest prefix first, so multi-character prefixes win over their first letter.
+_SORTED_PREFIXES = tuple(sorted(MULTIPLIER_MAPPING.keys(), key=len, reverse=True))
+
+# Delimiters of compound units ("1 to 5", "3, 5", "2 @ 25"), longest first.
+_SORTED_DELIMS = ("to", ",", "@")
+
+_DELIMS = frozenset(_SORTED_DELIMS)
+
+# Parentheses (for depth tracking) plus the delimiters, scanned in one pass.
+_SPLIT_RE = re.compile(r'\(|\)|' + '|'.join(map(re.escape, _SORTED_DELIMS)))
+
+# Strings without any delimiter are a single token, whatever their parentheses.
+_DELIM_RE = re.compile('|'.join(map(re.escape, _SORTED_DELIMS)))
+
+# Leading whitespace, numeric part and the whitespace before the unit of a token.
+# The unit body and trailing "(...)" are split off with string methods, which
+# avoids the backtracking a lazy '.*?' followed by optional groups causes.
+_TOKEN_HEAD_RE = re.compile(r'(\s*)([+\-±]?\d*(?:\.\d+)?)(\s*)')
+
+_OHM_RE = re.compile(r'ohm', re.IGNORECASE)
+
 ############################
 #  GITHUB HELPER FUNCTIONS #
 ############################
 
+# Set `debug = true` in the app secrets to show diagnostic output.
+DEBUG = st.secrets.get("debug", False)
+
+def debug_write(*args):
+    """
+    st.write for diagnostics; a no-op unless DEBUG is enabled, so normal runs
+    don't pay for the extra front-end messages.
+    """
+    if DEBUG:
+        st.write(*args)
+
+@st.cache_resource
+def _github_session() -> requests.Session:
+    """
+    HTTP session shared by all GitHub API calls, so consecutive requests reuse
+    one keep-alive connection instead of each doing a new TCP+TLS handshake.
+    """
+    return requests.Session()
+
+@st.cache_resource
+def _mapping_etag_cache() -> dict:
+    """
+    Last downloaded mapping DataFrame and its ETag, shared by all sessions so
+    an unchanged file can be revalidated with a conditional request.
+    """
+    return {}
+
+# Expires so edits made on GitHub directly show up; refetching is a cheap ETag revalidation.
+@st.cache_data(show_spinner=False, ttl=600)
 def download_mapping_file_from_github() -> pd.DataFrame:
     """
     Downloads 'mapping.xlsx' from a GitHub repo specified in secrets,
-    returns a DataFrame parsed from that file.
+    returns a DataFrame parsed from that file. A file_path ending in '.csv'
+    is read as CSV, which parses much faster than xlsx.
     """
-    st.write("DEBUG: Downloading mapping.xlsx from GitHub...")
+    debug_write("DEBUG: Downloading mapping.xlsx from GitHub...")
     github_token = st.secrets["github"]["token"]
     owner = st.secrets["github"]["owner"]
     repo = st.secrets["github"]["repo"]
     file_path = st.secrets["github"]["file_path"]
 
+    # The raw media type returns the file bytes directly instead of base64 inside JSON.
     url = f"https://api.github.com/repos/{owner}/{repo}/contents/{file_path}"
     headers = {
         "Authorization": f"token {github_token}",
-        "Accept": "application/vnd.github.v3+json"
+        "Accept": "application/vnd.github.v3.raw"
     }
 
-    response = requests.get(url, headers=headers)
-    if response.status_code == 200:
-        content_json = response.json()
-        encoded_content = content_json["content"]
-        decoded_bytes = base64.b64decode(encoded_content)
-
-        local_file = "mapping.xlsx"
-        with open(local_file, "wb") as f:
-            f.write(decoded_bytes)
+    # GitHub answers 304 with no body if the file is unchanged since our last download.
+    etag_cache = _mapping_etag_cache()
+    if "etag" in etag_cache:
+        headers["If-None-Match"] = etag_cache["etag"]
 
-        # Now parse the local file into a DataFrame
+    response = _github_session().get(url, headers=headers)
+    if response.status_code == 304:
+        debug_write("DEBUG: mapping.xlsx not modified, reusing the last download.")
+        return etag_cache["df"]
+    if response.status_code == 200:
+        # Parse the response body straight into a DataFrame
         try:
-            df = pd.read_excel(local_file)
+            if file_path.lower().endswith(".csv"):
+                # Only empty cells are missing; symbols such as "NA" stay text.
+                df = pd.read_csv(BytesIO(response.content), dtype=str, keep_default_na=False, na_values=[""])
+            else:
+                df = pd.read_excel(BytesIO(response.content), engine=_EXCEL_READ_ENGINE)
         except Exception as e:
             st.error(f"Failed to parse downloaded mapping file: {e}")
             st.stop()
-        os.remove(local_file)  # clean up local file
-        st.write("DEBUG: Download successful. mapping_df shape:", df.shape)
+        if "ETag" in response.headers:
+            etag_cache["etag"] = response.headers["ETag"]
+            etag_cache["df"] = df
+        debug_write("DEBUG: Download successful. mapping_df shape:", df.shape)
         return df
     else:
         st.error(f"Failed to download file from GitHub: {response.status_code} {response.text}")
         st.stop()
 
+def _get_current_sha(url: str, headers: dict):
+    """
+    Returns the SHA of the file at the given contents URL, or None if the
+    file doesn't exist yet.
+    """
+    current_response = _github_session().get(url, headers=headers)
+    if current_response.status_code == 200:
+        sha = current_response.json().get("sha")
+        debug_write("DEBUG: Current file SHA:", sha)
+        return sha
+    debug_write("DEBUG: No existing file found. Creating a new one...")
+    return None
+
 def update_mapping_file_on_github(mapping_df: pd.DataFrame) -> bool:
     """
     Updates 'mapping.xlsx' on GitHub using a PUT request to the GitHub API.
+    Written as CSV instead when file_path ends in '.csv'.
     """
-    st.write("DEBUG: Attempting to update mapping.xlsx on GitHub.")
-    st.write("DEBUG: DataFrame shape before upload:", mapping_df.shape)
+    debug_write("DEBUG: Attempting to update mapping.xlsx on GitHub.")
+    debug_write("DEBUG: DataFrame shape before upload:", mapping_df.shape)
 
     github_token = st.secrets["github"]["token"]
     owner = st.secrets["github"]["owner"]
     repo = st.secrets["github"]["repo"]
     file_path = st.secrets["github"]["file_path"]
 
-    # 1) Save DF to local file
-    temp_file = "mapping.xlsx"
-    mapping_df.to_excel(temp_file, index=False, engine='openpyxl')
+    # 1) Serialize DF in memory
+    buffer = BytesIO()
+    if file_path.lower().endswith(".csv"):
+        mapping_df.to_csv(buffer, index=False)
+    else:
+        mapping_df.to_excel(buffer, index=False, engine='xlsxwriter')
 
-    # 2) Encode local file in base64
-    with open(temp_file, "rb") as f:
-        content_bytes = f.read()
-    encoded_content = base64.b64encode(content_bytes).decode("utf-8")
+    # 2) Encode file content in base64
+    encoded_content = base64.b64encode(buffer.getvalue()).decode("utf-8")
 
-    # 3) Get the current file's SHA
+    # 3) Get the current file's SHA, reusing the one returned by this session's last save
     url = f"https://api.github.com/repos/{owner}/{repo}/contents/{file_path}"
     headers = {
         "Authorization": f"token {github_token}",
         "Accept": "application/vnd.github.v3+json"
     }
-    current_response = requests.get(url, headers=headers)
-    sha = None
-    if current_response.status_code == 200:
-        sha = current_response.json().get("sha")
-        st.write("DEBUG: Current file SHA:", sha)
-    else:
-        st.write("DEBUG: No existing file found. Creating a new one...")
+    cached_url, sha = st.session_state.get("mapping_sha", (None, None))
+    used_cached_sha = cached_url == url
+    if not used_cached_sha:
+        sha = _get_current_sha(url, headers)
 
     # 4) Prepare data payload
     data = {
@@ -120,11 +199,19 @@ def update_mapping_file_on_github(mapping_df: pd.DataFrame) -> bool:
         data["sha"] = sha
 
     # 5) PUT request to update file
-    update_response = requests.put(url, headers=headers, json=data)
-    os.remove(temp_file)  # clean up local file
+    update_response = _github_session().put(url, headers=headers, json=data)
+    if update_response.status_code == 409 and used_cached_sha:
+        # The file changed since our last save; retry once with its current SHA.
+        debug_write("DEBUG: Cached SHA is stale, fetching the current one.")
+        sha = _get_current_sha(url, headers)
+        data.pop("sha", None)
+        if sha:
+            data["sha"] = sha
+        update_response = _github_session().put(url, headers=headers, json=data)
 
     if update_response.status_code in [200, 201]:
-        st.write("DEBUG: Update/creation successful:", update_response.status_code)
+        debug_write("DEBUG: Update/creation successful:", update_response.status_code)
+        st.session_state["mapping_sha"] = (url, update_response.json()["content"]["sha"])
         return True
     else:
         st.error(f"Failed to update file on GitHub: {update_response.status_code} {update_response.text}")
@@ -134,125 +221,178 @@ def update_mapping_file_on_github(mapping_df: pd.DataFrame) -> bool:
 #   UNIT-PROCESSING LOGIC  #
 ############################
 
-def split_outside_parens(text, delimiters):
-    tokens = []
-    current = ""
-    i = 0
+# Set from the mapping file once it is loaded (see the app section below).
+_BASE_UNITS = frozenset()
+_UNIT_TABLE = {}
+
+def split_outside_parens(text):
+    """
+    Yields the non-empty pieces of text and the delimiters between them,
+    ignoring delimiters inside parentheses.
+    """
+    last = 0
     depth = 0
-    sorted_delims = sorted(delimiters, key=len, reverse=True)
-    while i < len(text):
-        ch = text[i]
-        if ch == '(':
+    for m in _SPLIT_RE.finditer(text):
+        matched = m.group()
+        if matched == '(':
             depth += 1
-            current += ch
-            i += 1
-        elif ch == ')':
+        elif matched == ')':
             depth = max(depth - 1, 0)
-            current += ch
-            i += 1
         elif depth == 0:
-            matched = None
-            for delim in sorted_delims:
-                if text[i:i+len(delim)] == delim:
-                    matched = delim
-                    break
-            if matched:
-                if current:
-                    tokens.append(current)
-                tokens.append(matched)
-                current = ""
-                i += len(matched)
-            else:
-                current += ch
-                i += 1
-        else:
-            current += ch
-            i += 1
-    if current:
-        tokens.append(current)
-    return tokens
-
-def process_unit_token_no_paren(token, base_units, multipliers_dict):
+            if m.start() > last:
+                yield text[last:m.start()]
+            yield matched
+            last = m.end()
+    if last < len(text):
+        yield text[last:]
+
+def build_unit_table(base_units):
+    """
+    Maps every recognized unit symbol, bare or with a multiplier prefix,
+    to its (prefix, base unit) pair so a token resolves with one lookup.
+    """
+    table = {}
+    for prefix in _SORTED_PREFIXES:
+        for base in base_units:
+            table.setdefault(sys.intern(prefix + base), (prefix, base))
+    # A bare base unit always wins over a prefix reading of the same symbol.
+    for base in base_units:
+        table[base] = ("", base)
+    return table
+
+def process_unit_token_no_paren(token):
+    """
+    Rewrites a unit body as '$' + base unit, dropping any multiplier prefix,
+    or returns an error string if the symbol is not recognized. The caller
+    passes the body already stripped of surrounding whitespace.
+    """
     if token.startswith('$'):
         after = token[1:]
-        stripped = after.strip()
+        stripped = after.lstrip()
         if stripped == "":
             return "$"
-        if stripped in base_units:
-            return "$" + after
-        for prefix in sorted(multipliers_dict.keys(), key=len, reverse=True):
-            if stripped.startswith(prefix):
-                possible = stripped[len(prefix):]
-                if possible in base_units:
-                    idx = after.find(prefix)
-                    if idx != -1:
-                        if idx == 1 and after[0] == " ":
-                            preserved = after[:0] + after[idx + len(prefix):]
-                        else:
-                            preserved = after[:idx] + after[idx + len(prefix):]
-                        return "$" + preserved
-        return f"Error: Undefined unit '{stripped}' (no recognized prefix)"
+        hit = _UNIT_TABLE.get(stripped)
+        if hit is None:
+            return f"Error: Undefined unit '{stripped}' (no recognized prefix)"
+        prefix, base = hit
+        gap = after[:len(after) - len(stripped)]
+        # A single space after '$' is dropped together with the prefix.
+        if prefix and gap == " ":
+            gap = ""
+        return "$" + gap + base
     else:
-        stripped = token.strip()
-        if stripped in base_units:
-            return "$" + stripped
-        for prefix in sorted(multipliers_dict.keys(), key=len, reverse=True):
-            if stripped.startswith(prefix):
-                possible = stripped[len(prefix):]
-                if possible in base_units:
-                    idx = token.find(prefix)
-                    if idx != -1:
-                        if idx > 0 and token[idx-1] == " ":
-                            if idx == 1:
-                                preserved = token[:0] + token[idx + len(prefix):]
-                            else:
-                                preserved = token[:idx] + token[idx + len(prefix):]
-                        else:
-                            preserved = token[:idx] + token[idx + len(prefix):]
-                        return "$" + preserved
-        return f"Error: Undefined unit '{stripped}' (no recognized prefix)"
-
-def process_unit_token(token, base_units, multipliers_dict):
-    pattern = re.compile(
-        r'^(?P<lead>\s*)'
-        r'(?P<numeric>[+\-±]?\d*(?:\.\d+)?)(?P<space1>\s*)'
-        r'(?P<unit>.*?)(?P<space2>\s*)'
-        r'(?P<paren>\([^)]*\))?'
-        r'(?P<trail>\s*)$'
-    )
-    m = pattern.match(token)
-    if not m:
+        hit = _UNIT_TABLE.get(token)
+        if hit is None:
+            return f"Error: Undefined unit '{token}' (no recognized prefix)"
+        return "$" + hit[1]
+
+# Distinct cell values still share most of their tokens ("10 kΩ to 20 kΩ",
+# "10 kΩ, 1 W"), so each token is resolved once. The function and its cache are
+# recreated on every script run, together with _UNIT_TABLE.
+@functools.lru_cache(maxsize=65536)
+def process_unit_token(token):
+    lead, numeric, space1 = _TOKEN_HEAD_RE.match(token).groups()
+    rest = token[len(lead) + len(numeric) + len(space1):]
+    body = rest.rstrip()
+    trail = rest[len(body):]
+    paren = ""
+    # A trailing "(...)" starts at the first '(' after the previous ')'.
+    if body.endswith(')'):
+        close = len(body) - 1
+        start = body.find('(', body.rfind(')', 0, close) + 1, close)
+        if start != -1:
+            paren = body[start:]
+            body = body[:start]
+    core = body.rstrip()
+    space2 = body[len(core):]
+    if '\n' in core:
         return token
-    lead = m.group('lead')
-    numeric = m.group('numeric')
-    space1 = m.group('space1')
-    unit_part = m.group('unit')
-    space2 = m.group('space2')
-    paren = m.group('paren') if m.group('paren') else ""
-    trail = m.group('trail')
-    core = unit_part.strip()
-    left_ws = re.match(r'^\s*', unit_part).group(0) or ""
-    right_ws = re.search(r'\s*$', unit_part).group(0) or ""
-    processed = process_unit_token_no_paren(core, base_units, multipliers_dict)
-    new_unit = left_ws + processed + right_ws
-    if "ohm" in core.lower():
+    new_unit = process_unit_token_no_paren(core)
+    # Cheap 'o'/'O' membership test first: most tokens can't contain "ohm" at all.
+    if ('o' in core or 'O' in core) and _OHM_RE.search(core):
         if new_unit.startswith("$") and not new_unit.startswith("$ "):
             new_unit = "$ " + new_unit[1:].lstrip()
         if numeric and not space1:
             space1 = " "
     return f"{lead}{numeric}{space1}{new_unit}{space2}{paren}{trail}"
 
-def resolve_compound_unit(normalized_unit, base_units, multipliers_dict):
-    tokens = split_outside_parens(normalized_unit, delimiters=["to", ",", "@"])
-    resolved_parts = []
-    for part in tokens:
-        if part in ["to", ",", "@"]:
-            resolved_parts.append(part)
-        else:
-            if part == "":
-                continue
-            resolved_parts.append(process_unit_token(part, base_units, multipliers_dict))
-    return "".join(resolved_parts)
+def resolve_compound_unit(normalized_unit):
+    return "".join(
+        part if part in _DELIMS else process_unit_token(part)
+        for part in split_outside_parens(normalized_unit)
+    )
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def process_input_file(file_bytes: bytes, base_units: frozenset) -> Optional[bytes]:
+    """
+    Parses an uploaded workbook, adds the 'Absolute Unit' column and returns the
+    output workbook as xlsx bytes, or None if there is no 'Normalized Unit' column.
+    Cached on the file contents and the base units, so Streamlit reruns don't
+    redo the work; only the serialized output is kept, never the DataFrame.
+    """
+    input_df = pd.read_excel(BytesIO(file_bytes), engine=_EXCEL_READ_ENGINE)
+    if "Normalized Unit" not in input_df.columns:
+        return None
+    # Unit strings repeat a lot across rows; resolve each distinct value once.
+    units = input_df["Normalized Unit"].map(str)
+    uniq = pd.Series(units.unique())
+    # Most cells hold a single unit with nothing to split on; skip the splitter for those.
+    simple = uniq.str.len().gt(0) & ~uniq.str.contains(_DELIM_RE)
+    resolved = dict(zip(uniq[simple], uniq[simple].map(process_unit_token)))
+    resolved.update(zip(uniq[~simple], uniq[~simple].map(resolve_compound_unit)))
+    input_df["Absolute Unit"] = units.map(resolved)
+    towrite = BytesIO()
+    input_df.to_excel(towrite, index=False, engine='xlsxwriter')
+    return towrite.getvalue()
+
+############################
+#   SESSION HELPERS        #
+############################
+
+def flush_new_rows():
+    """
+    Merges the units added in this session into st.session_state["mapping_df"]
+    with a single concat, instead of copying the DataFrame on every add.
+    """
+    if st.session_state["new_rows"]:
+        st.session_state["mapping_df"] = pd.concat(
+            [st.session_state["mapping_df"], pd.DataFrame(st.session_state["new_rows"])],
+            ignore_index=True
+        )
+        st.session_state["new_rows"] = []
+
+def get_unit_data(mapping_df: pd.DataFrame):
+    """
+    Returns (base units, unit table) for mapping_df plus the pending new units.
+    Kept in session_state and only rebuilt when one of those changes, not on
+    every Streamlit rerun.
+    """
+    pending_units = [row["Base Unit Symbol"] for row in st.session_state["new_rows"]]
+    cached = st.session_state.get("unit_data")
+    # Holding on to mapping_df itself makes the identity check safe.
+    if cached is None or cached[0] is not mapping_df or cached[1] != pending_units:
+        base_units = frozenset(
+            sys.intern(str(u).strip())
+            for u in mapping_df["Base Unit Symbol"].dropna().unique().tolist() + pending_units
+        )
+        cached = (mapping_df, pending_units, base_units, build_unit_table(base_units))
+        st.session_state["unit_data"] = cached
+    return cached[2], cached[3]
+
+def get_existing_units(mapping_df: pd.DataFrame) -> list:
+    """
+    Unit symbols offered for deletion: those in mapping_df followed by the
+    pending new units. Cached in session_state the same way as get_unit_data.
+    """
+    pending_units = [row["Base Unit Symbol"] for row in st.session_state["new_rows"]]
+    cached = st.session_state.get("existing_units")
+    if cached is None or cached[0] is not mapping_df or cached[1] != pending_units:
+        existing_units = list(dict.fromkeys(
+            mapping_df["Base Unit Symbol"].dropna().unique().tolist() + pending_units
+        ))
+        cached = (mapping_df, pending_units, existing_units)
+        st.session_state["existing_units"] = cached
+    return cached[2]
 
 ############################
 #   MAIN STREAMLIT APP     #
@@ -261,8 +401,11 @@ def resolve_compound_unit(normalized_unit, base_units, multipliers_dict):
 st.title("Unit Processing App (GitHub-based)")
 
 # Use session_state to store the DataFrame so we don't re-download after each interaction.
+# The download itself is cached across sessions by st.cache_data.
 if "mapping_df" not in st.session_state:
     st.session_state["mapping_df"] = download_mapping_file_from_github()
+# Units added via "Manage Units" that are not merged into mapping_df yet.
+st.session_state.setdefault("new_rows", [])
 
 mapping_df = st.session_state["mapping_df"]
 
@@ -272,36 +415,45 @@ if not required_cols.issubset(mapping_df.columns):
     st.error(f"Mapping file must contain columns: {required_cols}")
     st.stop()
 
-base_units = {str(u).strip() for u in mapping_df["Base Unit Symbol"].dropna().unique()}
+_BASE_UNITS, _UNIT_TABLE = get_unit_data(mapping_df)
 
 operation = st.selectbox("Select Operation", ["Get Pattern", "Manage Units"])
 
 if operation == "Get Pattern":
     st.header("Get Pattern")
     st.write("This mode processes an input Excel file using the mapping file (loaded from GitHub).")
-    input_file = st.file_uploader("Upload Input Excel File", type=["xlsx"])
-    if input_file:
-        try:
-            input_df = pd.read_excel(input_file)
-        except Exception as e:
-            st.error(f"Error reading input file: {e}")
+
+    # Processing only runs on submit; the serialized result is kept in session_state
+    # so other widget interactions (including the download itself) don't redo it.
+    with st.form("process_form"):
+        input_file = st.file_uploader("Upload Input Excel File", type=["xlsx"])
+        submit_process = st.form_submit_button("Process File")
+
+    if submit_process:
+        st.session_state.pop("result_xlsx", None)
+        if not input_file:
+            st.warning("Please upload an input Excel file first.")
         else:
-            if "Normalized Unit" not in input_df.columns:
-                st.error("Input file must contain a 'Normalized Unit' column.")
+            try:
+                result_xlsx = process_input_file(input_file.getvalue(), _BASE_UNITS)
+            except Exception as e:
+                st.error(f"Error reading input file: {e}")
             else:
-                input_df["Absolute Unit"] = input_df["Normalized Unit"].apply(
-                    lambda x: resolve_compound_unit(str(x), base_units, MULTIPLIER_MAPPING)
-                )
-                st.success("Processing completed!")
-                towrite = BytesIO()
-                input_df.to_excel(towrite, index=False, engine='openpyxl')
-                towrite.seek(0)
-                st.download_button(
-                    label="Download Output Excel File",
-                    data=towrite,
-                    file_name="output.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                )
+                if result_xlsx is None:
+                    st.error("Input file must contain a 'Normalized Unit' column.")
+                else:
+                    # Keep the mapping it was built from so later unit edits retire it.
+                    st.session_state["result_xlsx"] = (_BASE_UNITS, result_xlsx)
+                    st.success("Processing completed!")
+
+    result = st.session_state.get("result_xlsx")
+    if result is not None and result[0] == _BASE_UNITS:
+        st.download_button(
+            label="Download Output Excel File",
+            data=result[1],
+            file_name="output.xlsx",
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        )
 
 elif operation == "Manage Units":
     st.header("Manage Units")
@@ -309,6 +461,9 @@ elif operation == "Manage Units":
 
     st.subheader("Current Mapping File")
     st.dataframe(st.session_state["mapping_df"])
+    if st.session_state["new_rows"]:
+        st.write("Units added this session (merged into the file on download or save):")
+        st.dataframe(pd.DataFrame(st.session_state["new_rows"]))
 
     # --- Add a new unit ---
     with st.form("add_unit_form"):
@@ -318,23 +473,21 @@ elif operation == "Manage Units":
     if submit_new:
         if new_unit.strip():
             new_row = {"Base Unit Symbol": new_unit.strip(), "Multiplier Symbol": None}
-            st.session_state["mapping_df"] = pd.concat(
-                [st.session_state["mapping_df"], pd.DataFrame([new_row])],
-                ignore_index=True
-            )
+            st.session_state["new_rows"].append(new_row)
             st.success(f"New unit '{new_unit.strip()}' added!")
-            st.dataframe(st.session_state["mapping_df"])
+            st.dataframe(pd.DataFrame(st.session_state["new_rows"]))
         else:
             st.error("The unit field is required.")
 
     # --- Delete a unit ---
-    existing_units = st.session_state["mapping_df"]["Base Unit Symbol"].dropna().unique().tolist()
+    existing_units = get_existing_units(st.session_state["mapping_df"])
     if existing_units:
         to_delete = st.selectbox("Select a unit to delete", ["--Select--"] + existing_units)
         if st.button("Delete Selected Unit"):
             if to_delete == "--Select--":
                 st.warning("Please select a valid unit to delete.")
             else:
+                flush_new_rows()
                 before_shape = st.session_state["mapping_df"].shape
                 st.session_state["mapping_df"] = st.session_state["mapping_df"][
                     st.session_state["mapping_df"]["Base Unit Symbol"] != to_delete
@@ -347,8 +500,9 @@ elif operation == "Manage Units":
 
     # Option to download updated file locally
     if st.button("Download Updated Mapping File"):
+        flush_new_rows()
         towrite = BytesIO()
-        st.session_state["mapping_df"].to_excel(towrite, index=False, engine='openpyxl')
+        st.session_state["mapping_df"].to_excel(towrite, index=False, engine='xlsxwriter')
         towrite.seek(0)
         st.download_button(
             label="Download mapping.xlsx",
@@ -359,8 +513,10 @@ elif operation == "Manage Units":
 
     # Save changes back to GitHub
     if st.button("Save Changes to GitHub"):
-        st.write("DEBUG: Attempting to save changes to GitHub. DF shape:", st.session_state["mapping_df"].shape)
+        flush_new_rows()
+        debug_write("DEBUG: Attempting to save changes to GitHub. DF shape:", st.session_state["mapping_df"].shape)
         if update_mapping_file_on_github(st.session_state["mapping_df"]):
+            download_mapping_file_from_github.clear()
             st.success("Mapping file updated on GitHub!")
         else:
             st.error("Failed to update mapping file on GitHub.")